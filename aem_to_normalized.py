@@ -3,13 +3,18 @@
 # Usage examples (change URL as needed):
 # python aem_to_normalized.py --url 'https://publish-p151554-e1560130.adobeaemcloud.com/api/teladoc-core/v1/education?folder=/content/dam/teladoc-headless/en-us/education-service'
 #   --out output.json
+# Partial sync of one lesson (cms_id or path prefix, repeatable):
+# python aem_to_normalized.py --file export.json --out output.json --only my-lesson-id
+# Columnar snapshot next to the JSON (read back with ColumnarSnapshot), with load benchmark:
+# python aem_to_normalized.py --file export.json --out output.json --columnar-out snapshot/ --bench-load
 #
 # The script fetches AEM public JSON for Education service and normalizes it into
 # four tables: content, content_to_text, content_to_content, content_to_attribute.
 # It normalizes asset URLs, derives asset metadata (title/width/height/mime), and
 # builds relationships between Curriculum, Unit, Lesson and its children pages(imagePage,questionPage etc).
 
-import sys, os, json, argparse, ssl, base64
+import sys, os, json, argparse, ssl, base64, mmap, time
+from array import array
 from typing import Tuple, Optional, Dict, Set, List
 from datetime import datetime, timezone
 from urllib.parse import urlparse
@@ -35,6 +40,37 @@ def http_get(url: str, headers: dict, verify_ssl: bool = True, timeout: int = 60
             ct = r.headers.get_content_charset() or 'utf-8'
             return r.read().decode(ct, errors='replace')
 
+def http_get_head_bytes(url: str, headers: dict, max_bytes: int, verify_ssl: bool = True, timeout: int = 60, start: int = 0) -> bytes:
+    """
+    Fetch at most max_bytes of url starting at byte offset start (Range request). Servers
+    that ignore Range (200 instead of 206) are read only up to start+max_bytes and the
+    leading bytes are dropped.
+    """
+    hdrs = dict(headers or {})
+    hdrs['Range'] = f'bytes={start}-{start + max_bytes - 1}'
+    try:
+        import requests
+        with requests.get(url, headers=hdrs, timeout=timeout, verify=verify_ssl, stream=True) as r:
+            r.raise_for_status()
+            skip = start if r.status_code != 206 else 0
+            buf = b''
+            for chunk in r.iter_content(chunk_size=4096):
+                buf += chunk
+                if len(buf) >= skip + max_bytes:
+                    break
+            return buf[skip:skip + max_bytes]
+    except ImportError:
+        import urllib.request, urllib.error
+        req = urllib.request.Request(url, headers=hdrs)
+        ctx = None
+        if not verify_ssl:
+            ctx = ssl.create_default_context()
+            ctx.check_hostname = False
+            ctx.verify_mode = ssl.CERT_NONE
+        with urllib.request.urlopen(req, context=ctx, timeout=timeout) as r:
+            skip = start if r.status != 206 else 0
+            return r.read(skip + max_bytes)[skip:]
+
 # --- IDs & Maps ---
 CONTENT_TYPE_ID = {'Curriculum':1,'Unit':2,'Lesson':3,'Page':4,'Answer':5,'Asset':6,'Term':7,'Tag':8}
 PATH_TOKEN_TO_TYPE_ID = {'curriculum':1,'unit':2,'lesson':3,'question-answer':5,'term':7,'tag':8}
@@ -62,6 +98,12 @@ TEXT_FIELDS = {
 SPECIAL_TO_TEXT = {'titleRequiredEnglish':1,'descriptionRequiredEnglish':7}
 IMAGE_URL_KEYS = ['heroImage','thumbnailImage','posterImage','titleImage','icon','iconImage','title_image','titleimage']
 REL_DAM_RE = re.compile(r'^/content/dam/teladoc-headless/image/')
+IMAGE_PROBE_BYTES = 16384
+# JPEG SOF can sit behind large APPn segments (EXIF thumbnails, XMP, ICC): follow the segment
+# chain with a few small Range requests instead of downloading the file
+JPEG_PROBE_FOLLOW_BYTES = 4096
+JPEG_PROBE_MAX_FOLLOWS = 8
+JPEG_SOF_MARKERS = {0xC0,0xC1,0xC2,0xC3,0xC5,0xC6,0xC7,0xC9,0xCA,0xCB,0xCD,0xCE,0xCF}
 
 # Switch default to PROD later when content has been promoted to that AEM ENV.
 # DEV
@@ -69,6 +111,23 @@ DEFAULT_DAM_BASE = 'https://publish-p151554-e1560130.adobeaemcloud.com'
 # PROD
 # DEFAULT_DAM_BASE = 'https://publish-p151554-e1560174.adobeaemcloud.com'
 
+# Namespaces for surrogate_id(); a row's natural key is hashed under its table name.
+# A child listed more than once under the same parent/label (e.g. a page repeated in pages[])
+# keeps every edge: repeats append their occurrence number (1, 2, ...) to the CTC key.
+SURROGATE_KEY_COLUMNS = {
+    'content_to_text': ('content_cms_id','locale_id','text_type_id','text_index'),
+    'content_to_content': ('parent_cms_id','child_cms_id','child_content_label_id'),
+    'content_to_attribute': ('content_cms_id','attribute_id'),
+}
+
+def surrogate_id(table: str, *natural_key) -> int:
+    """
+    Deterministic positive 63-bit id for a row's natural key (same key → same id on every run).
+    """
+    import hashlib
+    digest = hashlib.blake2b(json.dumps([table, *natural_key]).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') & 0x7FFFFFFFFFFFFFFF
+
 # --- URL Helpers ---
 def _pick_base_url(items: List[dict]) -> Optional[str]:
     for it in items:
@@ -174,6 +233,94 @@ def fetch_asset_metadata(asset_id: str, base: Optional[str], timeout: int = 60,
     except Exception:
         return None
 
+def parse_image_header(buf: bytes) -> Optional[dict]:
+    """
+    Read width/height/mime from the leading bytes of a PNG, GIF, JPEG or WebP file.
+    Returns None when the format is unknown or the dimensions lie beyond buf.
+    """
+    import struct
+    if not buf:
+        return None
+    try:
+        if buf[:8] == b'\x89PNG\r\n\x1a\n' and buf[12:16] == b'IHDR':
+            w, h = struct.unpack('>II', buf[16:24])
+            return {'width': w, 'height': h, 'mime': 'image/png'}
+        if buf[:6] in (b'GIF87a', b'GIF89a'):
+            w, h = struct.unpack('<HH', buf[6:10])
+            return {'width': w, 'height': h, 'mime': 'image/gif'}
+        if buf[:4] == b'RIFF' and buf[8:12] == b'WEBP':
+            chunk = buf[12:16]
+            if chunk == b'VP8 ':
+                w, h = struct.unpack('<HH', buf[26:30])
+                return {'width': w & 0x3FFF, 'height': h & 0x3FFF, 'mime': 'image/webp'}
+            if chunk == b'VP8L':
+                bits = struct.unpack('<I', buf[21:25])[0]
+                return {'width': (bits & 0x3FFF) + 1, 'height': ((bits >> 14) & 0x3FFF) + 1, 'mime': 'image/webp'}
+            if chunk == b'VP8X':
+                w = int.from_bytes(buf[24:27], 'little') + 1
+                h = int.from_bytes(buf[27:30], 'little') + 1
+                return {'width': w, 'height': h, 'mime': 'image/webp'}
+            return None
+        if buf[:2] == b'\xff\xd8':
+            return _scan_jpeg_segments(buf, 2)[0]
+    except struct.error:
+        return None
+    return None
+
+def _scan_jpeg_segments(buf: bytes, i: int) -> Tuple[Optional[dict], Optional[int]]:
+    """
+    Walk JPEG marker segments in buf from offset i. Returns (dims, None) once an SOF is read,
+    (None, offset) when the next segment (or the SOF payload) starts at or beyond the end
+    of buf, and (None, None) on malformed data.
+    """
+    import struct
+    while i + 4 <= len(buf):
+        if buf[i] != 0xFF:
+            return None, None
+        marker = buf[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            i += 2
+            continue
+        if marker == 0xD9 or marker == 0xDA:
+            return None, None  # end of image / scan data before any SOF
+        seg_len = struct.unpack('>H', buf[i + 2:i + 4])[0]
+        if marker in JPEG_SOF_MARKERS:
+            if i + 9 > len(buf):
+                return None, i
+            h, w = struct.unpack('>HH', buf[i + 5:i + 9])
+            return {'width': w, 'height': h, 'mime': 'image/jpeg'}, None
+        i += 2 + seg_len
+    return None, i
+
+def probe_image_dimensions(url: str, timeout: int = 60, insecure: bool = False, max_bytes: int = IMAGE_PROBE_BYTES) -> Optional[dict]:
+    """
+    Fallback when DAM metadata is missing: read only the image header via a Range request.
+    """
+    if not isinstance(url, str) or not url.startswith(('http://', 'https://')):
+        return None
+    headers = {'Accept': 'image/*'}
+    try:
+        buf = http_get_head_bytes(url, headers=headers, max_bytes=max_bytes, verify_ssl=(not insecure), timeout=timeout)
+        dims = parse_image_header(buf)
+        if dims or buf[:2] != b'\xff\xd8':
+            return dims
+        # JPEG whose SOF lies past the first window: resume the segment walk with small reads
+        dims, nxt = _scan_jpeg_segments(buf, 2)
+        for _ in range(JPEG_PROBE_MAX_FOLLOWS):
+            if dims or nxt is None:
+                break
+            chunk = http_get_head_bytes(url, headers=headers, max_bytes=JPEG_PROBE_FOLLOW_BYTES, verify_ssl=(not insecure), timeout=timeout, start=nxt)
+            if len(chunk) < 4:
+                return None
+            dims, rel = _scan_jpeg_segments(chunk, 0)
+            nxt = nxt + rel if rel is not None else None
+        return dims
+    except Exception:
+        return None
+
 # --- Misc Helpers ---
 def now_iso():
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace('+00:00','Z')
@@ -190,11 +337,104 @@ def infer_type_label(path: str):
             ctype = PATH_TOKEN_TO_TYPE_ID[seg]
     return ctype, clabel
 
+# --- Subtree Selection ---
+SUBTREE_REF_KEYS = ['units','lessons','pages','potentialAnswers','correctAnswers']
+
+def _ref_basename(ref) -> str:
+    if isinstance(ref, dict):
+        p = ref.get('path', '')
+    elif isinstance(ref, str):
+        p = ref
+    else:
+        p = ''
+    return p.rstrip('/').split('/')[-1] if p else ''
+
+def _matches_selector(it: dict, selector: str) -> bool:
+    if it.get('name') == selector:
+        return True
+    prefix = selector.rstrip('/')
+    path = (it.get('path') or '').rstrip('/')
+    return bool(prefix.startswith('/') and path and (path == prefix or path.startswith(prefix + '/')))
+
+def select_subtree(items: List[dict], selectors: List[str]) -> List[dict]:
+    """
+    Keep only the items reachable from the selected Curricula/Units/Lessons/Pages.
+    A selector is either a cms_id (item name) or a path prefix starting with '/'.
+    The subtree follows units/lessons/pages/answers refs (plus the /curriculum/<id>/
+    path fallback used for Curriculum → Unit) and pulls in Terms whose contentReference
+    points at a reached page. Input order is preserved. Raises ValueError if any
+    selector matches no item, so a typo can't produce an empty snapshot.
+    """
+    selectors = [s.strip() for s in (selectors or []) if s and s.strip()]
+    if not selectors:
+        return items
+    by_name: Dict[str, dict] = {}
+    for it in items:
+        name = it.get('name')
+        if name:
+            by_name[name] = it
+
+    reached: Set[str] = set()
+    stack: List[str] = []
+    matched: Set[str] = set()
+    for it in items:
+        if not it.get('name'):
+            continue
+        hits = [s for s in selectors if _matches_selector(it, s)]
+        if hits:
+            matched.update(hits)
+            stack.append(it['name'])
+    unmatched = [s for s in selectors if s not in matched]
+    if unmatched:
+        raise ValueError(f"--only selector(s) matched no item by name or path prefix: {', '.join(unmatched)}")
+    while stack:
+        name = stack.pop()
+        if name in reached:
+            continue
+        reached.add(name)
+        it = by_name.get(name) or {}
+        data = it.get('data', {}) or {}
+        for key in SUBTREE_REF_KEYS:
+            refs = data.get(key)
+            if not isinstance(refs, list):
+                continue
+            for ref in refs:
+                child = _ref_basename(ref)
+                if child and child in by_name and child not in reached:
+                    stack.append(child)
+        ctype, _ = infer_type_label(it.get('path', ''))
+        if ctype == CONTENT_TYPE_ID['Curriculum'] and not (isinstance(data.get('units'), list) and data.get('units')):
+            marker = f"/curriculum/{name}/"
+            for other in items:
+                oname = other.get('name')
+                if oname and oname not in reached and marker in (other.get('path') or '') \
+                        and infer_type_label(other.get('path', ''))[0] == CONTENT_TYPE_ID['Unit']:
+                    stack.append(oname)
+
+    # Terms hang off ImagePages via Term.contentReference, so they are pulled in from the page side
+    for it in items:
+        name = it.get('name')
+        if not name or name in reached:
+            continue
+        if infer_type_label(it.get('path', ''))[0] != CONTENT_TYPE_ID['Term']:
+            continue
+        tdata = it.get('data', {}) or {}
+        refs = tdata.get('contentReference') or tdata.get('contentReferences')
+        if isinstance(refs, (dict, str)):
+            refs = [refs]
+        if isinstance(refs, list) and any(_ref_basename(r) in reached for r in refs):
+            reached.add(name)
+
+    return [it for it in items if it.get('name') in reached]
+
 # --- Transform ---
-def transform(items: List[dict], link_lessons_to_assets: bool = True, base_url: Optional[str] = None, asset_meta_timeout: int = 60, insecure: bool = False) -> dict:
+def transform(items: List[dict], link_lessons_to_assets: bool = True, base_url: Optional[str] = None, asset_meta_timeout: int = 60, insecure: bool = False, only: Optional[List[str]] = None, probe_dimensions: bool = True) -> dict:
     created = now_iso()
     if base_url is None:
         base_url = _pick_base_url(items) or DEFAULT_DAM_BASE
+    if only:
+        # Partial sync: restrict everything (incl. asset metadata fetches) to the selected subtree
+        items = select_subtree(items, only)
 
     content: List[dict] = []
     ctt: List[dict] = []
@@ -430,7 +670,7 @@ def transform(items: List[dict], link_lessons_to_assets: bool = True, base_url:
             asset_ext_hint[aid] = ext
         if aid not in roles_per_asset:
             roles_per_asset[aid] = set()
-        order_list.append(aid)
+            order_list.append(aid)
         roles_per_asset[aid].add(role)
         # maintain asset content_label_id as highest role seen overall
         arow = content_index.get(aid)
@@ -477,12 +717,14 @@ def transform(items: List[dict], link_lessons_to_assets: bool = True, base_url:
                     if aid:
                         _record_asset(aid, url, 404, parent_id, encounter_order, roles_per_asset)
 
-        # emit one edge PER ROLE for each asset (priority-desc)
+        # emit one edge PER ROLE for each asset (priority-desc); child_index counts this parent's asset edges
+        asset_idx = 0
         for aid in encounter_order:
             roles = sorted(list(roles_per_asset.get(aid, {None})), key=lambda r: ROLE_PRIORITY.get(r,0), reverse=True)
             for role in roles:
-                ctc.append({'id': None,'parent_cms_id': parent_id,'child_cms_id': aid,'child_content_label_id': role,'child_index': len(ctc),
+                ctc.append({'id': None,'parent_cms_id': parent_id,'child_cms_id': aid,'child_content_label_id': role,'child_index': asset_idx,
                             'created_date': created,'deleted_date': ''})
+                asset_idx += 1
 
     # Page → Asset (multi-role)
     page_to_assets: Dict[str, List[Tuple[str, Set[Optional[int]]]]] = {}
@@ -520,12 +762,14 @@ def transform(items: List[dict], link_lessons_to_assets: bool = True, base_url:
 
         # emit to Page
         listing: List[Tuple[str, Set[Optional[int]]]] = []
+        asset_idx = 0
         for aid in encounter_order:
             roles = roles_per_asset.get(aid, set())
             # output edges for each role (priority-desc)
             for role in sorted(list(roles), key=lambda r: ROLE_PRIORITY.get(r,0), reverse=True):
-                ctc.append({'id': None,'parent_cms_id': pid,'child_cms_id': aid,'child_content_label_id': role,'child_index': len(ctc),
+                ctc.append({'id': None,'parent_cms_id': pid,'child_cms_id': aid,'child_content_label_id': role,'child_index': asset_idx,
                             'created_date': created,'deleted_date': ''})
+                asset_idx += 1
             listing.append((aid, roles))
         page_to_assets[pid] = listing
 
@@ -633,7 +877,8 @@ def transform(items: List[dict], link_lessons_to_assets: bool = True, base_url:
                                    asset_ext_hint: Dict[str, str],
                                    asset_url_map: Dict[str, str],
                                    timeout: int,
-                                   insecure: bool):
+                                   insecure: bool,
+                                   probe_dimensions: bool = True):
         if not aid:
             return
         existing_types: Set[int] = set()
@@ -654,12 +899,18 @@ def transform(items: List[dict], link_lessons_to_assets: bool = True, base_url:
             ext = derive_asset_ext(url)
 
         meta = None
-        if should_fetch and ext:
-            if aid not in asset_meta_cache:
+        if aid in asset_meta_cache:
+            meta = asset_meta_cache.get(aid)
+        else:
+            if should_fetch and ext:
                 meta = fetch_asset_metadata(aid, base=base_url, timeout=timeout, insecure=insecure, ext_hint=ext)
-                asset_meta_cache[aid] = meta
-            else:
-                meta = asset_meta_cache.get(aid)
+            # DAM metadata missing or without dimensions → probe the image header instead of downloading it
+            if probe_dimensions and (not meta or not meta.get('width') or not meta.get('height')):
+                probed = probe_image_dimensions(url, timeout=timeout, insecure=insecure)
+                if probed:
+                    meta = dict(meta or {'title': aid})
+                    meta.update(probed)
+            asset_meta_cache[aid] = meta
 
         meta = meta or {}
         title = (meta.get('title') or aid)
@@ -679,7 +930,8 @@ def transform(items: List[dict], link_lessons_to_assets: bool = True, base_url:
     for aid in sorted(url_assets):
         _enrich_asset_ctt_rows_for(aid=aid, base_url=base_url, created=created, ctt=ctt,
                                    asset_meta_cache=asset_meta_cache, asset_ext_hint=asset_ext_hint,
-                                   asset_url_map=asset_url_map, timeout=asset_meta_timeout, insecure=insecure)
+                                   asset_url_map=asset_url_map, timeout=asset_meta_timeout, insecure=insecure,
+                                   probe_dimensions=probe_dimensions)
 
     # NOTE: Removed the optional Lesson ← Page assets cascade. Assets remain at their native level.
 
@@ -694,8 +946,312 @@ def transform(items: List[dict], link_lessons_to_assets: bool = True, base_url:
         deduped_ctt.append(row)
     ctt = deduped_ctt
 
+    # Surrogate ids from natural keys; one row per key. Rows are emitted TEXT_FIELDS first, then the
+    # SPECIAL_TO_TEXT fallbacks and derived rows (Term display name, asset metadata), so the first row wins:
+    # e.g. data.title beats titleRequiredEnglish. text_index is never rewritten, so ids stay tied to their field.
+    kept_ctt: List[dict] = []
+    used_ctt_keys: Set[tuple] = set()
+    for row in ctt:
+        key = (row.get('content_cms_id'), int(row.get('locale_id', 1)), int(row.get('text_type_id')), int(row.get('text_index', 0)))
+        if key in used_ctt_keys:
+            continue
+        used_ctt_keys.add(key)
+        row['id'] = surrogate_id('content_to_text', *key)
+        kept_ctt.append(row)
+    ctt = kept_ctt
+    ctc_occurrences: Dict[tuple, int] = {}
+    for row in ctc:
+        key = tuple(row.get(c) for c in SURROGATE_KEY_COLUMNS['content_to_content'])
+        seen = ctc_occurrences.get(key, 0)
+        ctc_occurrences[key] = seen + 1
+        row['id'] = surrogate_id('content_to_content', *key) if seen == 0 else surrogate_id('content_to_content', *key, seen)
+    seen_cta_ids: Set[int] = set()
+    kept_cta: List[dict] = []
+    for row in cta:
+        rid = surrogate_id('content_to_attribute', *(row.get(c) for c in SURROGATE_KEY_COLUMNS['content_to_attribute']))
+        if rid in seen_cta_ids:
+            continue  # same attribute via categories and tags
+        seen_cta_ids.add(rid)
+        row['id'] = rid
+        kept_cta.append(row)
+    cta = kept_cta
+
     return {'content': content,'content_to_text': ctt,'content_to_content': ctc,'content_to_attribute': cta}
 
+# --- Columnar Snapshot ---
+# Directory layout (all integers are little-endian int64):
+#   manifest.json                 tables, row counts, column kinds, indexed columns
+#   strings.dat / strings.off     sorted string dictionary (utf-8 blob + n+1 offsets)
+#   <table>.<col>.col             one value per row
+#   <table>.<col>.idx.off/.rows   CSR index: rows of string id i are rows[off[i]:off[i+1]]
+# Column kinds: 'int' (INT_NULL for None), 'str' (dictionary id, -1 for None) and
+# 'scalar' for mixed columns (dictionary id for str, -(id+2) for the JSON of other values).
+COLUMNAR_FORMAT = 'aem-normalized-columnar'
+COLUMNAR_VERSION = 1
+INT_NULL = -(2 ** 63)
+COLUMNAR_INDEX_COLUMNS = {
+    'content': ['cms_id'],
+    'content_to_text': ['content_cms_id'],
+    'content_to_content': ['parent_cms_id','child_cms_id'],
+    'content_to_attribute': ['content_cms_id'],
+}
+
+def _write_int64(path: str, values) -> None:
+    arr = array('q', values)
+    if sys.byteorder != 'little':
+        arr.byteswap()
+    with open(path, 'wb') as f:
+        arr.tofile(f)
+
+def _column_kind(values: List) -> str:
+    if all(v is None or (isinstance(v, int) and not isinstance(v, bool)) for v in values):
+        return 'int'
+    if all(v is None or isinstance(v, str) for v in values):
+        return 'str'
+    return 'scalar'
+
+def write_columnar_snapshot(out: dict, out_dir: str) -> str:
+    """
+    Write the four tables of transform() output as a memory-mappable column store.
+    Read it back with ColumnarSnapshot.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    tables: Dict[str, Dict[str, List]] = {}
+    kinds: Dict[str, Dict[str, str]] = {}
+    strings: Set[str] = set()
+    for tname in COLUMNAR_INDEX_COLUMNS:
+        rows = out.get(tname) or []
+        cols: List[str] = []
+        for row in rows:
+            for k in row:
+                if k not in cols:
+                    cols.append(k)
+        # index columns always exist, so an empty table still answers cms_id queries
+        cols.extend(c for c in COLUMNAR_INDEX_COLUMNS[tname] if c not in cols)
+        tables[tname] = {c: [row.get(c) for row in rows] for c in cols}
+        kinds[tname] = {}
+        for c, values in tables[tname].items():
+            kind = _column_kind(values)
+            if c in COLUMNAR_INDEX_COLUMNS[tname] and all(v is None for v in values):
+                kind = 'str'
+            kinds[tname][c] = kind
+            if kind == 'str':
+                strings.update(v for v in values if v is not None)
+            elif kind == 'scalar':
+                strings.update(v if isinstance(v, str) else json.dumps(v) for v in values if v is not None)
+
+    dictionary = sorted(strings)
+    string_id = {s: i for i, s in enumerate(dictionary)}
+    blob = bytearray()
+    offsets = [0]
+    for s in dictionary:
+        blob += s.encode('utf-8')
+        offsets.append(len(blob))
+    with open(os.path.join(out_dir, 'strings.dat'), 'wb') as f:
+        f.write(bytes(blob))
+    _write_int64(os.path.join(out_dir, 'strings.off'), offsets)
+
+    manifest = {'format': COLUMNAR_FORMAT, 'version': COLUMNAR_VERSION, 'strings': len(dictionary), 'tables': {}}
+    for tname, cols in tables.items():
+        nrows = len(out.get(tname) or [])
+        for c, values in cols.items():
+            kind = kinds[tname][c]
+            if kind == 'int':
+                encoded = [INT_NULL if v is None else v for v in values]
+            elif kind == 'str':
+                encoded = [-1 if v is None else string_id[v] for v in values]
+            else:
+                encoded = [-1 if v is None else (string_id[v] if isinstance(v, str) else -(string_id[json.dumps(v)] + 2)) for v in values]
+            _write_int64(os.path.join(out_dir, f'{tname}.{c}.col'), encoded)
+        indexed = [c for c in COLUMNAR_INDEX_COLUMNS[tname] if kinds[tname].get(c) == 'str']
+        for c in indexed:
+            buckets: Dict[int, List[int]] = {}
+            for ri, v in enumerate(cols[c]):
+                if v is not None:
+                    buckets.setdefault(string_id[v], []).append(ri)
+            idx_off = [0]
+            idx_rows: List[int] = []
+            for sid in range(len(dictionary)):
+                idx_rows.extend(buckets.get(sid, ()))
+                idx_off.append(len(idx_rows))
+            _write_int64(os.path.join(out_dir, f'{tname}.{c}.idx.off'), idx_off)
+            _write_int64(os.path.join(out_dir, f'{tname}.{c}.idx.rows'), idx_rows)
+        manifest['tables'][tname] = {'rows': nrows, 'columns': kinds[tname], 'indexed': indexed}
+
+    with open(os.path.join(out_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return out_dir
+
+class ColumnarSnapshot:
+    """
+    Memory-mapped reader for write_columnar_snapshot() output. Only the files that a
+    query touches are mapped; lookups by cms_id go through the sorted string dictionary
+    and the per-column CSR index, so nothing is parsed up front.
+
+        with ColumnarSnapshot('snapshot/') as snap:
+            snap.rows('content_to_text', 'content_cms_id', 'my-lesson-id')
+            snap.count('content_to_content', 'parent_cms_id', 'my-lesson-id')
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, 'manifest.json'), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format') != COLUMNAR_FORMAT:
+            raise ValueError(f"{path} is not a columnar snapshot")
+        self._files: Dict[str, Tuple] = {}
+        self._ints: Dict[str, object] = {}
+        self._blob = self._map('strings.dat')
+        self._string_off = self._int64('strings.off')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        for name in list(self._ints) + list(self._files):
+            view = self._ints.pop(name, None)
+            if isinstance(view, memoryview):
+                view.release()
+        for view, mm in self._files.values():
+            view.release()
+            if mm is not None:
+                try:
+                    mm.close()
+                except BufferError:
+                    pass  # caller still holds a view; the map goes away with it
+        self._files = {}
+
+    def _map(self, name: str) -> memoryview:
+        if name not in self._files:
+            fh = open(os.path.join(self.path, name), 'rb')
+            try:
+                mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(fh.fileno()).st_size else None
+            finally:
+                fh.close()
+            view = memoryview(mm) if mm is not None else memoryview(b'')
+            self._files[name] = (view, mm)
+        return self._files[name][0]
+
+    def _int64(self, name: str):
+        if name not in self._ints:
+            raw = self._map(name)
+            if sys.byteorder == 'little':
+                self._ints[name] = raw.cast('q')
+            else:
+                arr = array('q', raw.tobytes())
+                arr.byteswap()
+                self._ints[name] = arr
+        return self._ints[name]
+
+    # strings
+    def string(self, sid: int) -> str:
+        return bytes(self._blob[self._string_off[sid]:self._string_off[sid + 1]]).decode('utf-8')
+
+    def string_id(self, s: str) -> Optional[int]:
+        lo, hi = 0, self.manifest['strings']
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.string(mid) < s:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.manifest['strings'] and self.string(lo) == s:
+            return lo
+        return None
+
+    # tables
+    def tables(self) -> List[str]:
+        return list(self.manifest['tables'])
+
+    def row_count(self, table: str) -> int:
+        return self.manifest['tables'][table]['rows']
+
+    def column(self, table: str, col: str):
+        """Raw encoded int64 values of a column (see the kinds described above)."""
+        return self._int64(f'{table}.{col}.col')
+
+    def _decode(self, kind: str, v: int):
+        if kind == 'int':
+            return None if v == INT_NULL else v
+        if v == -1:
+            return None
+        if v >= 0:
+            return self.string(v)
+        return json.loads(self.string(-v - 2))
+
+    def value(self, table: str, col: str, row: int):
+        return self._decode(self.manifest['tables'][table]['columns'][col], self.column(table, col)[row])
+
+    def row(self, table: str, row: int) -> dict:
+        return {c: self.value(table, c, row) for c in self.manifest['tables'][table]['columns']}
+
+    def _check_indexed(self, table: str, col: str) -> bool:
+        """True if col can be looked up, False if the table is empty (nothing to find)."""
+        if col in self.manifest['tables'][table]['indexed']:
+            return True
+        if self.row_count(table) == 0 and col in COLUMNAR_INDEX_COLUMNS.get(table, ()):
+            return False
+        raise KeyError(f"{table}.{col} is not indexed")
+
+    def row_ids(self, table: str, col: str, cms_id: str) -> List[int]:
+        if not self._check_indexed(table, col):
+            return []
+        sid = self.string_id(cms_id)
+        if sid is None:
+            return []
+        off = self._int64(f'{table}.{col}.idx.off')
+        return list(self._int64(f'{table}.{col}.idx.rows')[off[sid]:off[sid + 1]])
+
+    def count(self, table: str, col: str, cms_id: str) -> int:
+        if not self._check_indexed(table, col):
+            return 0
+        sid = self.string_id(cms_id)
+        if sid is None:
+            return 0
+        off = self._int64(f'{table}.{col}.idx.off')
+        return off[sid + 1] - off[sid]
+
+    def rows(self, table: str, col: str, cms_id: str) -> List[dict]:
+        return [self.row(table, ri) for ri in self.row_ids(table, col, cms_id)]
+
+def benchmark_snapshot_load(json_path: str, snapshot_dir: str, cms_ids: List[str], repeat: int = 5) -> dict:
+    """
+    Time "open + look up rows for cms_ids" against the JSON output and the columnar snapshot.
+    Returns best-of-repeat seconds for each, plus the number of rows found (which must match).
+    """
+    def _json_lookup():
+        with open(json_path, 'r', encoding='utf-8') as f:
+            out = json.load(f)
+        wanted = set(cms_ids)
+        found = 0
+        for tname, cols in COLUMNAR_INDEX_COLUMNS.items():
+            for row in out.get(tname) or []:
+                found += sum(1 for c in cols if row.get(c) in wanted)
+        return found
+
+    def _columnar_lookup():
+        with ColumnarSnapshot(snapshot_dir) as snap:
+            found = 0
+            for tname, cols in COLUMNAR_INDEX_COLUMNS.items():
+                for c in cols:
+                    if c in snap.manifest['tables'][tname]['indexed']:
+                        found += sum(len(snap.rows(tname, c, cid)) for cid in cms_ids)
+            return found
+
+    result = {}
+    for label, fn in (('json', _json_lookup), ('columnar', _columnar_lookup)):
+        best, found = None, 0
+        for _ in range(max(1, repeat)):
+            t0 = time.perf_counter()
+            found = fn()
+            dt = time.perf_counter() - t0
+            best = dt if best is None else min(best, dt)
+        result[label] = {'seconds': best, 'rows': found}
+    return result
+
 # --- CLI ---
 def main(argv=None):
     ap = argparse.ArgumentParser()
@@ -710,7 +1266,14 @@ def main(argv=None):
     ap.add_argument('--insecure', action='store_true')
     ap.add_argument('--dam-base', help='Override base URL for DAM assets (e.g., https://publish-...adobeaemcloud.com)')
     ap.add_argument('--asset-meta-timeout', type=int, default=60, help='Timeout for fetching asset metadata JSON')
+    ap.add_argument('--no-dim-probe', action='store_true', help='Do not probe image headers (Range request) when DAM metadata is missing')
+    ap.add_argument('--columnar-out', help='Also write a memory-mappable columnar snapshot to this directory')
+    ap.add_argument('--bench-load', action='store_true', help='With --columnar-out: compare load+lookup time of the JSON output vs the snapshot')
+    ap.add_argument('--only', action='append', default=[], help='Limit output to the subtree of a cms_id or path prefix (repeatable, comma-separated)')
     args = ap.parse_args(argv)
+    if args.bench_load and not args.columnar_out:
+        ap.error('--bench-load requires --columnar-out')
+    only = [s for arg in args.only for s in arg.split(',') if s.strip()]
 
     if args.url:
         headers = {'Accept': 'application/json'}
@@ -734,11 +1297,20 @@ def main(argv=None):
     if not isinstance(items, list):
         raise ValueError("Input JSON does not contain a top-level 'data' array.")
 
-    out = transform(items, link_lessons_to_assets=True, base_url=(args.dam_base or None), asset_meta_timeout=args.asset_meta_timeout, insecure=args.insecure)
+    out = transform(items, link_lessons_to_assets=True, base_url=(args.dam_base or None), asset_meta_timeout=args.asset_meta_timeout, insecure=args.insecure, only=only, probe_dimensions=not args.no_dim_probe)
 
     with open(args.out, 'w', encoding='utf-8') as f:
         json.dump(out, f, indent=2)
     print('OK', len(out['content']), len(out['content_to_text']), len(out['content_to_content']), len(out['content_to_attribute']))
+    if args.columnar_out:
+        write_columnar_snapshot(out, args.columnar_out)
+        if args.bench_load:
+            rows = out['content']
+            sample = [r['cms_id'] for r in rows[::max(1, len(rows) // 10)]][:10]
+            res = benchmark_snapshot_load(args.out, args.columnar_out, sample)
+            print('BENCH', f"lookups={len(sample)}",
+                  f"json={res['json']['seconds']*1000:.2f}ms/{res['json']['rows']}rows",
+                  f"columnar={res['columnar']['seconds']*1000:.2f}ms/{res['columnar']['rows']}rows")
     return 0
 
 if __name__ == '__main__':